@@ -1,108 +1,377 @@
 # diagnostic_pipeline_ui.py
 import streamlit as st
+import concurrent.futures
+import copy
 import json
+import time
 from datetime import datetime
-from enum import Enum
-from requirements_loader import RequirementsLoader
-from step3_clarifying_chat_ai import ClarifyingChatAIAgent
-from step4_final_handoff import FinalHandoffManager, create_step4_ui
-from step4_json_store import Step4JSONStore
- 
-# Page configuration
-st.set_page_config(
-    page_title="Diagnostic Pipeline",
-    page_icon="📊",
-    layout="wide"
+from typing import TYPE_CHECKING
+from streamlit.errors import StreamlitAPIException
+from ui_common import (
+    ABOUT_MD,
+    MODEL_LABEL_TO_CODE,
+    MODEL_TYPE_VALUES,
+    PURPOSE_LABEL_TO_CODE,
+    PORTFOLIO_VALUES,
+    PURPOSE_VALUES,
+    configure_page,
 )
  
-# Custom CSS for styling
-st.markdown("""
-    <style>
-    .main {
-        max-width: 1000px;
-        padding: 2rem;
-    }
-    .header {
-        color: #2c3e50;
-        margin-bottom: 2rem;
-    }
-    .stSelectbox, .stButton {
-        margin: 1rem 0;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+# The pipeline step modules are imported where first used; with the
+# st.cache_resource factories below that happens at most once per process
+if TYPE_CHECKING:
+    from requirements_loader import RequirementsLoader
+    from step3_clarifying_chat_ai import ClarifyingChatAIAgent
+    from step4_final_handoff import FinalHandoffManager
+ 
+configure_page()
+ 
+# Number of chat messages rendered initially, and how many more each "Show older" click reveals
+CHAT_WINDOW = 30
+CHAT_WINDOW_BATCH = 25
+ 
+# Seconds an LLM readiness probe result is reused before re-probing the agent
+LLM_READY_TTL = 5.0
  
-# Enums for dropdown options
-class ModelType(str, Enum):
-    PD = "PD (Probability of Default)"
-    LGD = "LGD (Loss Given Default)"
-    EAD = "EAD (Exposure at Default)"
+@st.cache_resource
+def get_requirements_loader() -> "RequirementsLoader":
+    """Process-wide requirements loader shared by all sessions"""
+    from requirements_loader import get_shared_loader
+    return get_shared_loader()
  
-class Portfolio(str, Enum):
-    RETAIL = "Retail"
-    COMMERCIAL = "Commercial"
-    WHOLESALE = "Wholesale"
+@st.cache_resource
+def get_chat_agent_template() -> "ClarifyingChatAIAgent":
+    """Process-wide chat agent with LLM clients and requirements context preloaded"""
+    from step3_clarifying_chat_ai import ClarifyingChatAIAgent
+    return ClarifyingChatAIAgent()
  
-class Purpose(str, Enum):
-    IFRS9 = "IFRS 9"
-    AIRB = "AIRB (Advanced Internal Ratings-Based)"
-    ADJUDICATION = "Adjudication"
+@st.cache_resource
+def get_handoff_manager() -> "FinalHandoffManager":
+    """Process-wide handoff manager shared by all sessions"""
+    from step4_final_handoff import FinalHandoffManager
+    return FinalHandoffManager()
+ 
+@st.cache_resource
+def get_draft_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Process-wide worker pool for draft JSON writes, kept off the render path"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="draft-save")
+ 
+@st.cache_resource
+def get_question_prefetch_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Process-wide worker pool for speculative next-question LLM calls"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="question-prefetch")
  
 # Initialize session state variables
 def init_session_state():
-    """Initialize all required session state variables"""
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    """Initialize all required session state variables (once per session)"""
+    if "_initialized" in st.session_state:
+        return
+
+    defaults = {
+        "messages": [],
+        "current_question": None,
+        "diagnostic_started": False,
+        "selected_config": None,
+        "show_step4": False,
+        "chat_last_prompt_field": None,
+        "draft_saved": False,
+        "draft_future": None,
+        "last_lookup_result": None,
+        "chat_window": CHAT_WINDOW,
+    }
+    for key, value in defaults.items():
+        st.session_state.setdefault(key, value)
+
+    # Shared services come from the st.cache_resource factories above; the
+    # handoff manager is only fetched once Step 4 is shown
     if "requirements_loader" not in st.session_state:
-        st.session_state.requirements_loader = RequirementsLoader()
+        st.session_state.requirements_loader = get_requirements_loader()
     if "chat_ai_agent" not in st.session_state:
-        st.session_state.chat_ai_agent = ClarifyingChatAIAgent()
-    if "handoff_manager" not in st.session_state:
-        st.session_state.handoff_manager = FinalHandoffManager()
-    if "current_question" not in st.session_state:
-        st.session_state.current_question = None
-    if "diagnostic_started" not in st.session_state:
-        st.session_state.diagnostic_started = False
-    if "selected_config" not in st.session_state:
-        st.session_state.selected_config = None
-    if "show_step4" not in st.session_state:
-        st.session_state.show_step4 = False
-    if "chat_last_prompt_field" not in st.session_state:
-        st.session_state.chat_last_prompt_field = None
-    if "draft_saved" not in st.session_state:
-        st.session_state.draft_saved = False
-    if "last_lookup_result" not in st.session_state:
-        st.session_state.last_lookup_result = None
+        # Shallow copy: LLM clients are shared (their I/O all runs on one process-wide loop), chat session state is per-user
+        st.session_state.chat_ai_agent = copy.copy(get_chat_agent_template())
+
+    st.session_state._initialized = True
  
 init_session_state()
  
-def perform_diagnostic_context_lookup(purpose: str, model_type: str) -> dict:
-    """Load requirements for the selected configuration"""
-    try:
-        requirements_loader = st.session_state.requirements_loader
+def get_llm_readiness() -> tuple:
+    """Return (llm_ready, question_llm_ready, chat_llm_ready), re-probing the agent at most every LLM_READY_TTL seconds"""
+    cached = st.session_state.get("_llm_ready_cache")
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < LLM_READY_TTL:
+        return cached[1:]
+ 
+    agent = st.session_state.chat_ai_agent
+    readiness = []
+    for probe in ("_llm_ready", "_question_llm_ready", "_chat_llm_ready"):
+        try:
+            readiness.append(bool(getattr(agent, probe)()))
+        except Exception:
+            readiness.append(False)
+ 
+    st.session_state._llm_ready_cache = (now, *readiness)
+    return tuple(readiness)
+ 
+def build_llm_status_lines(model_name, llm_ready, question_llm_ready, chat_llm_ready,
+                           last_err, q_err, c_err) -> list:
+    """Return the (kind, text) status lines shown under the completion metrics"""
+    lines = []
+    if model_name:
+        lines.append((
+            "caption",
+            f"LLM model: {model_name} ({'ready' if llm_ready else 'not ready'}) | "
+            f"questions: {'ready' if question_llm_ready else 'fallback'} | "
+            f"chat: {'ready' if chat_llm_ready else 'fallback'}"
+        ))
  
-        if not requirements_loader.validate_configuration(purpose, model_type):
-            return {
-                "success": False,
-                "error": f"No requirements defined for: {purpose} + {model_type}",
-                "available_configurations": requirements_loader.get_available_configurations()
-            }
+    last_err = str(last_err or '')
+    if last_err and ('status_code: 402' in last_err or 'Insufficient credits' in last_err):
+        lines.append((
+            "warning",
+            'LLM credits appear to be exhausted (402: Insufficient credits). '
+            'The app will fall back to deterministic prompts until credits are restored or the model/provider is changed.'
+        ))
  
-        active_requirements = requirements_loader.get_active_requirements(purpose, model_type)
-        st.session_state.active_requirements = active_requirements
+    q_err = str(q_err or '')
+    c_err = str(c_err or '')
+    if q_err and not question_llm_ready:
+        lines.append(("caption", f"Question LLM error: {q_err[:160]}"))
+    if c_err and not chat_llm_ready:
+        lines.append(("caption", f"Chat LLM error: {c_err[:160]}"))
+    return lines
  
+def _show_older_messages() -> None:
+    st.session_state.chat_window += CHAT_WINDOW_BATCH
+ 
+@st.cache_data(show_spinner=False)
+def _lookup_requirements(purpose: str, model_type: str) -> dict:
+    """Resolve (purpose, model_type) to its lookup result; cached across reruns"""
+    requirements_loader = get_requirements_loader()
+ 
+    if not requirements_loader.validate_configuration(purpose, model_type):
         return {
-            "success": True,
-            "active_requirements": active_requirements,
-            "lookup_key": requirements_loader._build_lookup_key(purpose, model_type)
+            "success": False,
+            "error": f"No requirements defined for: {purpose} + {model_type}",
+            "available_configurations": requirements_loader.get_available_configurations()
         }
  
+    return {
+        "success": True,
+        "active_requirements": requirements_loader.get_active_requirements(purpose, model_type),
+        "lookup_key": requirements_loader._build_lookup_key(purpose, model_type)
+    }
+ 
+def perform_diagnostic_context_lookup(purpose: str, model_type: str) -> dict:
+    """Load requirements for the selected configuration"""
+    try:
+        return _lookup_requirements(purpose, model_type)
+ 
     except Exception as e:
         return {
             "success": False,
             "error": f"Error loading requirements: {str(e)}"
         }
  
+@st.fragment
+def _clarifying_chat_fragment() -> None:
+    """Clarifying chat UI; chat submissions rerun only this fragment, not the sidebar and header"""
+    st.markdown("---")
+    st.subheader("Clarifying Chat")
+
+    # Agent, completion status and LLM readiness are read once per rerun and
+    # reused below; a submitted message triggers a fresh rerun
+    agent = st.session_state.chat_ai_agent
+    completion_status = agent.get_completion_status()
+    llm_ready, question_llm_ready, chat_llm_ready = get_llm_readiness()
+
+    # Submit the draft write before the next question is resolved below, so the
+    # disk I/O on the worker thread overlaps the question LLM round-trip; the
+    # outcome is collected at the end of this or a later rerun
+    if (
+        completion_status.get("all_mandatory_complete", False)
+        and not st.session_state.get("draft_saved", False)
+        and st.session_state.get("draft_future") is None
+    ):
+        try:
+            from step4_json_store import Step4JSONStore
+
+            collected_data = agent.get_collected_data()
+            ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            filename = f"diagnostic_draft_{ts}.json"
+            json_store = Step4JSONStore(filename=filename)
+            st.session_state.draft_future = get_draft_executor().submit(
+                json_store.save,
+                {
+                    "header": collected_data.get("header", {}),
+                    "user_specs": collected_data.get("user_specs", {}),
+                },
+                completion_status=completion_status,
+            )
+        except Exception as e:
+            st.error(f"Error saving draft: {str(e)}")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Mandatory Fields", f"{completion_status['mandatory_completed']}/{completion_status['mandatory_total']}")
+    with col2:
+        st.metric("Optional Fields", f"{completion_status['optional_completed']}/{completion_status['optional_total']}")
+    with col3:
+        status_emoji = "✅" if completion_status['all_mandatory_complete'] else "⏳"
+        st.metric("Status", f"{status_emoji} {'Complete' if completion_status['all_mandatory_complete'] else 'In Progress'}")
+
+    try:
+        caption_sig = (
+            getattr(agent, 'model_name', None),
+            llm_ready,
+            question_llm_ready,
+            chat_llm_ready,
+            getattr(agent, 'last_ai_error', None),
+            getattr(agent, 'last_question_ai_error', None),
+            getattr(agent, 'last_chat_ai_error', None),
+        )
+        # Caption text is rebuilt only when the model, readiness or errors change
+        if st.session_state.get("_caption_sig") != caption_sig:
+            st.session_state._caption_sig = caption_sig
+            st.session_state._caption_lines = build_llm_status_lines(*caption_sig)
+
+        for kind, text in st.session_state._caption_lines:
+            if kind == "warning":
+                st.warning(text)
+            else:
+                st.caption(text)
+    except Exception:
+        pass
+
+    chat_history = []
+    try:
+        if getattr(agent, "session", None) is not None:
+            chat_history = agent.session.chat_history
+    except Exception:
+        chat_history = []
+
+    # Resolving the next question (which may call the question LLM), its source
+    # captions and the seeding check depend only on this fingerprint; reruns that
+    # leave it unchanged reuse the captions from the last resolution
+    session = getattr(agent, "session", None)
+    clarify_fp = (
+        getattr(session, "session_id", None),
+        completion_status.get('mandatory_completed'),
+        completion_status.get('optional_completed'),
+        question_llm_ready,
+    )
+    clarify_cache = st.session_state.get("_clarify_cache")
+    if clarify_cache is not None and clarify_cache[0] == clarify_fp + (len(chat_history),):
+        question_lines = clarify_cache[1]
+    else:
+        question_lines = []
+        try:
+            next_question = agent.get_next_pending_question()
+        except Exception:
+            next_question = None
+
+        if next_question is not None:
+            try:
+                is_llm = False
+                if session is not None:
+                    cache_llm = getattr(session, 'question_cache_llm', {})
+                    is_llm = bool(cache_llm.get(next_question.field_name, False))
+                source = 'llm' if is_llm else 'fallback'
+                question_lines.append(f"Question source: {source}")
+
+                if not is_llm:
+                    rej = str(getattr(agent, 'last_question_rejection', '') or '')
+                    if rej.strip():
+                        question_lines.append(f"Fallback reason: {rej}")
+            except Exception:
+                pass
+
+            prompt_parts = [str(next_question.question or '').strip()]
+            if getattr(next_question, "context", None) and str(next_question.context).strip():
+                prompt_parts.append(f"Context: {next_question.context}")
+            if getattr(next_question, "example", None) and str(next_question.example).strip():
+                prompt_parts.append(f"Example: {next_question.example}")
+            assistant_prompt = "\n\n".join([p for p in prompt_parts if p])
+
+            prompt_hash = hash(assistant_prompt)
+            already_seeded = bool(
+                chat_history
+                and st.session_state.chat_last_prompt_field == next_question.field_name
+                and st.session_state.get("chat_last_prompt_hash") == prompt_hash
+            )
+
+            if not already_seeded:
+                try:
+                    if session is not None:
+                        agent.add_chat_message(
+                            'assistant', assistant_prompt, field_name=next_question.field_name
+                        )
+                        chat_history = session.chat_history
+                        st.session_state.chat_last_prompt_field = next_question.field_name
+                        st.session_state.chat_last_prompt_hash = prompt_hash
+                except Exception:
+                    pass
+
+        st.session_state._clarify_cache = (clarify_fp + (len(chat_history),), question_lines)
+
+    for text in question_lines:
+        st.caption(text)
+
+    # Only the tail of the history is rendered; the agent keeps the full conversation
+    hidden_count = len(chat_history) - st.session_state.chat_window
+    if hidden_count > 0:
+        st.button(f"Show older messages ({hidden_count} hidden)", on_click=_show_older_messages)
+
+    # Entries are normalized by the agent when written (see add_chat_message)
+    for msg in chat_history[-st.session_state.chat_window:]:
+        if msg.get("_nonempty") and msg["role"] in ("user", "assistant"):
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"])
+
+    # While the user types, generate the question that follows the pending one
+    if question_llm_ready:
+        try:
+            agent.prefetch_next_question(get_question_prefetch_executor())
+        except Exception:
+            pass
+
+    user_text = st.chat_input("Type your response...")
+    if user_text:
+        try:
+            # On success the rerun redraws from the agent's chat history and seeds
+            # the next question, so bubbles are only drawn while the LLM streams
+            if chat_llm_ready:
+                with st.chat_message("user"):
+                    st.markdown(str(user_text))
+                with st.chat_message("assistant"):
+                    st.write_stream(agent.stream_user_message(user_text))
+                resp = agent.last_turn_result or {}
+            else:
+                resp = agent.handle_user_message(user_text)
+                if not resp.get("success"):
+                    with st.chat_message("assistant"):
+                        st.markdown(resp.get("message", "Failed to process message"))
+
+            if resp.get("success"):
+                try:
+                    st.rerun(scope="fragment")
+                except StreamlitAPIException:
+                    # Not inside a fragment rerun (e.g. first run after Run Diagnostic)
+                    st.rerun()
+        except Exception as e:
+            st.error(f"Submission error: {str(e)}")
+            st.exception(e)
+
+    if completion_status.get("all_complete", False):
+        st.success("All clarifying questions completed!")
+
+    draft_future = st.session_state.get("draft_future")
+    if draft_future is not None and draft_future.done():
+        st.session_state.draft_future = None
+        if draft_future.exception() is None:
+            st.session_state.draft_saved = True
+        else:
+            st.error(f"Error saving draft: {str(draft_future.exception())}")
+ 
 # Sidebar configuration
 with st.sidebar:
     st.title("Configuration")
@@ -110,21 +379,21 @@ with st.sidebar:
  
     model_type = st.selectbox(
         "Model Type",
-        [m.value for m in ModelType],
+        MODEL_TYPE_VALUES,
         index=0,
         help="Select the type of credit risk model"
     )
  
     portfolio = st.selectbox(
         "Portfolio",
-        [p.value for p in Portfolio],
+        PORTFOLIO_VALUES,
         index=0,
         help="Select the portfolio type"
     )
  
     purpose = st.selectbox(
         "Purpose",
-        [p.value for p in Purpose],
+        PURPOSE_VALUES,
         index=0,
         help="Select the purpose of the analysis"
     )
@@ -137,10 +406,15 @@ with st.sidebar:
             "model_type": model_type,
             "portfolio": portfolio,
             "purpose": purpose,
+            # Requirement-file codes, resolved once from the display labels
+            "clean_model_type": MODEL_LABEL_TO_CODE[model_type],
+            "clean_purpose": PURPOSE_LABEL_TO_CODE[purpose],
         }
         st.session_state.show_step4 = False
         st.session_state.chat_last_prompt_field = None
         st.session_state.draft_saved = False
+        st.session_state.draft_future = None
+        st.session_state.chat_window = CHAT_WINDOW
  
 # Main content area
 st.title("Risk Diagnostic Pipeline")
@@ -154,27 +428,26 @@ if run_analysis or st.session_state.get("diagnostic_started", False):
         purpose = st.session_state.selected_config["purpose"]
  
     st.subheader("Selected Configuration:")
-    col1, col2, col3 = st.columns([1.5, 1, 1])
-    with col1:
-        st.markdown("**Model Type**")
-        st.markdown(f'<div style="font-size: 2.0rem; line-height: 1.2;">{model_type}</div>', unsafe_allow_html=True)
-    with col2:
-        st.markdown("**Portfolio**")
-        st.markdown(f'<div style="font-size: 2.0rem; line-height: 1.2;">{portfolio}</div>', unsafe_allow_html=True)
-    with col3:
-        st.markdown("**Purpose**")
-        st.markdown(f'<div style="font-size: 2.0rem; line-height: 1.2;">{purpose}</div>', unsafe_allow_html=True)
+    st.markdown(
+        '<div style="display: grid; grid-template-columns: 1.5fr 1fr 1fr; gap: 1rem;">'
+        f'<div><p><strong>Model Type</strong></p><div style="font-size: 2.0rem; line-height: 1.2;">{model_type}</div></div>'
+        f'<div><p><strong>Portfolio</strong></p><div style="font-size: 2.0rem; line-height: 1.2;">{portfolio}</div></div>'
+        f'<div><p><strong>Purpose</strong></p><div style="font-size: 2.0rem; line-height: 1.2;">{purpose}</div></div>'
+        '</div>',
+        unsafe_allow_html=True,
+    )
  
     # Load requirements when analysis is run
     if run_analysis:
         with st.spinner("Loading diagnostic requirements..."):
-            clean_model_type = model_type.split(" ")[0] if " " in model_type else model_type
-            clean_purpose = purpose.split(" ")[0] if " " in purpose else purpose
+            clean_model_type = st.session_state.selected_config["clean_model_type"]
+            clean_purpose = st.session_state.selected_config["clean_purpose"]
  
             lookup_result = perform_diagnostic_context_lookup(clean_purpose, clean_model_type)
  
             if lookup_result["success"]:
                 st.success("Requirements loaded successfully!")
+                st.session_state.active_requirements = lookup_result["active_requirements"]
 
                 # Initialize the chat agent with loaded requirements
                 st.session_state.chat_ai_agent.initialize_session(
@@ -196,173 +469,8 @@ if run_analysis or st.session_state.get("diagnostic_started", False):
     lookup_result = st.session_state.get("last_lookup_result")
     
     if lookup_result and lookup_result.get("success"):
-        st.markdown("---")
-        st.subheader("Clarifying Chat")
-
-        # Show completion status
-        completion_status = st.session_state.chat_ai_agent.get_completion_status()
- 
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Mandatory Fields", f"{completion_status['mandatory_completed']}/{completion_status['mandatory_total']}")
-        with col2:
-            st.metric("Optional Fields", f"{completion_status['optional_completed']}/{completion_status['optional_total']}")
-        with col3:
-            status_emoji = "✅" if completion_status['all_mandatory_complete'] else "⏳"
-            st.metric("Status", f"{status_emoji} {'Complete' if completion_status['all_mandatory_complete'] else 'In Progress'}")
-
-        try:
-            model_name = getattr(st.session_state.chat_ai_agent, 'model_name', None)
-            llm_ready = False
-            question_llm_ready = False
-            chat_llm_ready = False
-            try:
-                llm_ready = bool(getattr(st.session_state.chat_ai_agent, '_llm_ready')())
-            except Exception:
-                llm_ready = False
-            try:
-                question_llm_ready = bool(getattr(st.session_state.chat_ai_agent, '_question_llm_ready')())
-            except Exception:
-                question_llm_ready = False
-            try:
-                chat_llm_ready = bool(getattr(st.session_state.chat_ai_agent, '_chat_llm_ready')())
-            except Exception:
-                chat_llm_ready = False
-            if model_name:
-                st.caption(
-                    f"LLM model: {model_name} ({'ready' if llm_ready else 'not ready'}) | "
-                    f"questions: {'ready' if question_llm_ready else 'fallback'} | "
-                    f"chat: {'ready' if chat_llm_ready else 'fallback'}"
-                )
-
-            try:
-                last_err = str(getattr(st.session_state.chat_ai_agent, 'last_ai_error', '') or '')
-                if last_err and ('status_code: 402' in last_err or 'Insufficient credits' in last_err):
-                    st.warning(
-                        'LLM credits appear to be exhausted (402: Insufficient credits). '
-                        'The app will fall back to deterministic prompts until credits are restored or the model/provider is changed.'
-                    )
-            except Exception:
-                pass
-
-            try:
-                q_err = str(getattr(st.session_state.chat_ai_agent, 'last_question_ai_error', '') or '')
-                c_err = str(getattr(st.session_state.chat_ai_agent, 'last_chat_ai_error', '') or '')
-                if q_err and not question_llm_ready:
-                    st.caption(f"Question LLM error: {q_err[:160]}")
-                if c_err and not chat_llm_ready:
-                    st.caption(f"Chat LLM error: {c_err[:160]}")
-            except Exception:
-                pass
-        except Exception:
-            pass
-
-        chat_history = []
-        try:
-            if getattr(st.session_state.chat_ai_agent, "session", None) is not None:
-                chat_history = st.session_state.chat_ai_agent.session.chat_history
-        except Exception:
-            chat_history = []
-
-        try:
-            next_question = st.session_state.chat_ai_agent.get_next_pending_question()
-        except Exception:
-            next_question = None
-
-        if next_question is not None:
-            try:
-                source = 'fallback'
-                is_llm = False
-                if getattr(st.session_state.chat_ai_agent, 'session', None) is not None:
-                    cache_llm = getattr(st.session_state.chat_ai_agent.session, 'question_cache_llm', {})
-                    is_llm = bool(cache_llm.get(next_question.field_name, False))
-                source = 'llm' if is_llm else 'fallback'
-                st.caption(f"Question source: {source}")
-
-                if not is_llm:
-                    rej = str(getattr(st.session_state.chat_ai_agent, 'last_question_rejection', '') or '')
-                    if rej.strip():
-                        st.caption(f"Fallback reason: {rej}")
-            except Exception:
-                pass
-
-            prompt_parts = [str(next_question.question or '').strip()]
-            if getattr(next_question, "context", None) and str(next_question.context).strip():
-                prompt_parts.append(f"Context: {next_question.context}")
-            if getattr(next_question, "example", None) and str(next_question.example).strip():
-                prompt_parts.append(f"Example: {next_question.example}")
-            assistant_prompt = "\n\n".join([p for p in prompt_parts if p])
-
-            last_msg = chat_history[-1] if chat_history else None
-            already_seeded = bool(
-                last_msg
-                and last_msg.get('role') == 'assistant'
-                and str(last_msg.get('field_name') or '') == str(next_question.field_name or '')
-                and str(last_msg.get('content') or '').strip() == assistant_prompt.strip()
-            )
-
-            if not already_seeded:
-                try:
-                    if getattr(st.session_state.chat_ai_agent, "session", None) is not None:
-                        st.session_state.chat_ai_agent.session.chat_history.append({
-                            'role': 'assistant',
-                            'field_name': next_question.field_name,
-                            'content': assistant_prompt,
-                            'timestamp': __import__('datetime').datetime.now().isoformat(),
-                        })
-                        chat_history = st.session_state.chat_ai_agent.session.chat_history
-                except Exception:
-                    pass
-
-            st.session_state.chat_last_prompt_field = next_question.field_name
-
-        for msg in chat_history:
-            role = msg.get("role")
-            content = str(msg.get("content", "") or "")
-            if role in ("user", "assistant") and content.strip():
-                with st.chat_message(role):
-                    st.markdown(content)
-
-        user_text = st.chat_input("Type your response...")
-        if user_text:
-            try:
-                with st.chat_message("user"):
-                    st.markdown(str(user_text))
-
-                with st.chat_message("assistant"):
-                    typing_placeholder = st.empty()
-                    typing_placeholder.markdown("...")
-
-                resp = st.session_state.chat_ai_agent.handle_user_message(user_text)
-                if not resp.get("success"):
-                    typing_placeholder.markdown(resp.get("message", "Failed to process message"))
-                else:
-                    st.rerun()
-            except Exception as e:
-                st.error(f"Submission error: {str(e)}")
-                st.exception(e)
-
-        completion_status = st.session_state.chat_ai_agent.get_completion_status()
-        if completion_status.get("all_complete", False):
-            st.success("All clarifying questions completed!")
-
-        if completion_status.get("all_mandatory_complete", False) and not st.session_state.get("draft_saved", False):
-            try:
-                collected_data = st.session_state.chat_ai_agent.get_collected_data()
-                ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                filename = f"diagnostic_draft_{ts}.json"
-                json_store = Step4JSONStore(filename=filename)
-                json_store.save(
-                    {
-                        "header": collected_data.get("header", {}),
-                        "user_specs": collected_data.get("user_specs", {}),
-                    },
-                    completion_status=completion_status,
-                )
-                st.session_state.draft_saved = True
-            except Exception as e:
-                st.error(f"Error saving draft: {str(e)}")
-
+        _clarifying_chat_fragment()
+ 
     elif lookup_result and not lookup_result.get("success"):
         st.error("Failed to load requirements")
         st.error(lookup_result["error"])
@@ -371,22 +479,12 @@ if run_analysis or st.session_state.get("diagnostic_started", False):
             st.info("Available configurations:")
             st.json(lookup_result["available_configurations"])
 else:
-    st.markdown("""
-    
-    ### 
-    # About This Tool
-    This diagnostic pipeline helps analyze credit risk models by:
-    - Validating model performance
-    - Identifying potential issues
-    - Generating comprehensive reports
-    
-    ### Next Steps
-    1. Select your model type, portfolio, and purpose
-    2. Click 'Run Diagnostic'
-    3. Review the results and download reports
-    """)
+    with st.expander("About This Tool", expanded=False):
+        st.markdown(ABOUT_MD)
  
 # Step 4 - Final Handoff
 if st.session_state.get("show_step4", False):
-    create_step4_ui(st.session_state.handoff_manager)
+    from step4_final_handoff import create_step4_ui
+
+    create_step4_ui(get_handoff_manager())
  
\ No newline at end of file
@@ -0,0 +1,19 @@
+# json_codec.py
+from typing import Any
+
+import orjson
+
+
+def encode(obj: Any, pretty: bool = False) -> bytes:
+    """UTF-8 JSON bytes; non-string dict keys are stringified and non-ASCII characters kept as-is"""
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+    return orjson.dumps(obj, option=option)
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    return encode(obj, pretty=pretty).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str, bytes, bytearray or memoryview; raises json.JSONDecodeError on bad input"""
+    return orjson.loads(data)
@@ -1,9 +1,14 @@
 # requirements_loader.py
+import functools
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 from enum import Enum
 
+import streamlit as st
+
+import json_codec
+
 
 class ModelType(str, Enum):
     PD = "PD"
@@ -17,6 +22,74 @@ class Purpose(str, Enum):
     ADJUDICATION = "Adjudication"
 
 
+@st.cache_resource(show_spinner=False)
+def _load_requirements(path: str) -> Dict[str, Any]:
+    """
+    Read and parse a requirements context file once per process.
+    
+    The parsed dict is shared by every RequirementsLoader (and session) using
+    the same path; failures raise and are not cached.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Requirements context file not found: {path}"
+        )
+    
+    try:
+        with open(path, 'rb') as file:
+            requirements_data = json_codec.loads(file.read())
+    except json.JSONDecodeError as e:
+        raise json.JSONDecodeError(
+            f"Invalid JSON in requirements file: {path}",
+            e.doc,
+            e.pos
+        )
+    
+    # Convert mandatory strings to boolean for consistency, once per load
+    for config in requirements_data.values():
+        if not isinstance(config, dict):
+            continue
+        for field_config in config.values():
+            if isinstance(field_config, dict) and isinstance(field_config.get('mandatory'), str):
+                field_config['mandatory'] = field_config['mandatory'].lower() == 'true'
+    
+    return requirements_data
+
+
+@functools.lru_cache(maxsize=16)
+def _compute_available_configurations(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Parse the configuration keys of a requirements file into their components.
+    
+    Cached per path alongside _load_requirements; both are cleared together by
+    RequirementsLoader.clear_cache(). Callers must not mutate the result.
+    """
+    requirements_data = _load_requirements(path)
+    configurations = {}
+    
+    for key in requirements_data.keys():
+        if key.endswith("_Requirements"):
+            # Parse the key to extract purpose and model_type
+            parts = key[:-12].split("_")  # Remove "_Requirements" suffix
+            if len(parts) >= 2:
+                purpose = parts[0]
+                model_type = parts[1]  # Take only the second part for simple model types
+                # Handle cases where there might be more parts (unlikely for current setup)
+                if len(parts) > 2:
+                    # If there are more parts, join them with underscore
+                    model_type = "_".join(parts[1:])
+                
+                # Clean up any trailing underscores
+                model_type = model_type.rstrip("_")
+                
+                configurations[key] = {
+                    "purpose": purpose,
+                    "model_type": model_type
+                }
+    
+    return configurations
+
+
 class RequirementsLoader:
     """
     Step 2 - Diagnostic Context Lookup
@@ -33,7 +106,6 @@ class RequirementsLoader:
             requirements_file_path: Path to the requirements_context.json file
         """
         self.requirements_file_path = requirements_file_path
-        self._requirements_cache: Optional[Dict[str, Any]] = None
     
     def _load_requirements_file(self) -> Dict[str, Any]:
         """
@@ -46,26 +118,11 @@ class RequirementsLoader:
             FileNotFoundError: If the requirements file doesn't exist
             json.JSONDecodeError: If the file contains invalid JSON
         """
-        if self._requirements_cache is not None:
-            return self._requirements_cache
-        
-        if not os.path.exists(self.requirements_file_path):
-            raise FileNotFoundError(
-                f"Requirements context file not found: {self.requirements_file_path}"
-            )
-        
-        try:
-            with open(self.requirements_file_path, 'r', encoding='utf-8') as file:
-                self._requirements_cache = json.load(file)
-                return self._requirements_cache
-        except json.JSONDecodeError as e:
-            raise json.JSONDecodeError(
-                f"Invalid JSON in requirements file: {self.requirements_file_path}",
-                e.doc,
-                e.pos
-            )
+        return _load_requirements(self.requirements_file_path)
     
-    def _build_lookup_key(self, purpose: str, model_type: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _build_lookup_key(purpose: str, model_type: str) -> str:
         """
         Build the lookup key for the requirements context file.
         
@@ -78,8 +135,8 @@ class RequirementsLoader:
         """
         # Normalize inputs to match the enum values
         # Handle display formatting like "AIRB (Advanced Internal Ratings-Based)" -> "AIRB"
-        purpose_normalized = purpose.upper().split(" ")[0].split("(")[0].strip()
-        model_type_normalized = model_type.upper().split(" ")[0].split("(")[0].strip()
+        purpose_normalized = purpose.upper().partition(" ")[0].partition("(")[0].strip()
+        model_type_normalized = model_type.upper().partition(" ")[0].partition("(")[0].strip()
         
         # Special case: "IFRS 9" should become "IFRS9"
         if purpose_normalized == "IFRS":
@@ -115,15 +172,8 @@ class RequirementsLoader:
                 f"Available configurations: {available_keys}"
             )
         
-        active_requirements = requirements_data[lookup_key]
-        
-        # Convert mandatory strings to boolean for consistency
-        for field_name, field_config in active_requirements.items():
-            if isinstance(field_config, dict) and 'mandatory' in field_config:
-                if isinstance(field_config['mandatory'], str):
-                    field_config['mandatory'] = field_config['mandatory'].lower() == 'true'
-        
-        return active_requirements
+        # Mandatory flags are already normalized to bool at load time
+        return requirements_data[lookup_key]
     
     def validate_configuration(self, purpose: str, model_type: str) -> bool:
         """
@@ -151,33 +201,33 @@ class RequirementsLoader:
             Dictionary mapping configuration keys to their parsed components
         """
         try:
-            requirements_data = self._load_requirements_file()
-            configurations = {}
-            
-            for key in requirements_data.keys():
-                if key.endswith("_Requirements"):
-                    # Parse the key to extract purpose and model_type
-                    parts = key[:-12].split("_")  # Remove "_Requirements" suffix
-                    if len(parts) >= 2:
-                        purpose = parts[0]
-                        model_type = parts[1]  # Take only the second part for simple model types
-                        # Handle cases where there might be more parts (unlikely for current setup)
-                        if len(parts) > 2:
-                            # If there are more parts, join them with underscore
-                            model_type = "_".join(parts[1:])
-                        
-                        # Clean up any trailing underscores
-                        model_type = model_type.rstrip("_")
-                        
-                        configurations[key] = {
-                            "purpose": purpose,
-                            "model_type": model_type
-                        }
-            
-            return configurations
+            return _compute_available_configurations(self.requirements_file_path)
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
     
     def clear_cache(self):
-        """Clear the internal requirements cache."""
-        self._requirements_cache = None
+        """Clear the shared requirements caches so the file is re-read on next use."""
+        _load_requirements.clear()
+        _compute_available_configurations.cache_clear()
+
+
+_PRELOADED = None
+
+
+def get_shared_loader() -> RequirementsLoader:
+    """
+    Return the process-wide RequirementsLoader, creating it on first use.
+    
+    The requirements file is parsed eagerly on creation so the first session
+    does not pay the load; a missing or invalid file is left to surface on the
+    first lookup, as before.
+    """
+    global _PRELOADED
+    if _PRELOADED is None:
+        loader = RequirementsLoader()
+        try:
+            loader._load_requirements_file()
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        _PRELOADED = loader
+    return _PRELOADED
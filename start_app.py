@@ -2,10 +2,10 @@
 """
 Start the Streamlit diagnostic pipeline application
 """
-import subprocess
-import sys
 import os
 
+from streamlit.web import bootstrap
+
 def main():
     """Start the Streamlit app"""
     print("Starting Diagnostic Pipeline UI...")
@@ -17,8 +17,9 @@ def main():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(script_dir)
     
-    # Start Streamlit
-    subprocess.run([sys.executable, "-m", "streamlit", "run", "diagnostic_pipeline_ui.py"])
+    # Start Streamlit in this process (no second interpreter to spawn)
+    bootstrap.load_config_options(flag_options={})
+    bootstrap.run("diagnostic_pipeline_ui.py", False, [], flag_options={})
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,48 @@
 # step3_clarifying_chat_ai.py
 import streamlit as st
-from typing import Dict, Any, List, Optional, Literal
+import asyncio
+from concurrent.futures import Executor, Future
+from typing import Dict, Any, Iterator, List, Optional, Literal, Tuple
 from datetime import datetime
 import json
 from pathlib import Path
 from pydantic import BaseModel, Field
 import os
+import queue
+import threading
+import uuid
 
 from dotenv import load_dotenv
 from pydantic_ai import Agent
 
+try:
+    import uvloop
+    _new_event_loop = uvloop.new_event_loop
+except ImportError:  # uvloop is unavailable on Windows
+    _new_event_loop = asyncio.new_event_loop
+
+_llm_loop: Optional[asyncio.AbstractEventLoop] = None
+_llm_loop_lock = threading.Lock()
+
+
+def _get_llm_loop() -> asyncio.AbstractEventLoop:
+    """
+    Process-wide event loop, running on a daemon thread, that every LLM request goes through.
+
+    The agents (and their HTTP clients) are shared by all sessions, and pooled
+    connections are bound to the loop that opened them, so there is exactly one.
+    """
+    global _llm_loop
+    with _llm_loop_lock:
+        if _llm_loop is None:
+            _llm_loop = _new_event_loop()
+            threading.Thread(target=_llm_loop.run_forever, name='llm-event-loop', daemon=True).start()
+        return _llm_loop
+
+
+# Seconds get_next_pending_question waits for a prefetch still in flight before asking again itself
+_PREFETCH_WAIT_SECONDS = 10.0
+
 
 class DiagnosticContext(BaseModel):
     """Context for the diagnostic pipeline"""
@@ -48,6 +81,7 @@ class UserResponse(BaseModel):
 class ChatSession(BaseModel):
     """Complete chat session state"""
     context: DiagnosticContext
+    session_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     collected_data: Dict[str, str] = Field(default_factory=dict)
     field_status: Dict[str, FieldStatus] = Field(default_factory=dict)
     chat_history: List[Dict[str, Any]] = Field(default_factory=list)
@@ -112,12 +146,17 @@ class ClarifyingChatAIAgent:
     
     def __init__(self):
         self.session: Optional[ChatSession] = None
+        self._completion_status_cache: Optional[Dict[str, Any]] = None
+        self._field_summary_cache: Optional[List[Dict[str, Any]]] = None
         self.agent: Optional[Agent] = None
         self.chat_agent: Optional[Agent] = None
         self.last_ai_error: Optional[str] = None
         self.last_question_ai_error: Optional[str] = None
         self.last_chat_ai_error: Optional[str] = None
         self.last_question_rejection: Optional[str] = None
+        self.last_turn_result: Optional[Dict[str, Any]] = None
+        # (field_name, future) of the speculative question generation in flight
+        self._prefetch: Optional[Tuple[str, Future]] = None
 
         self.model_name: Optional[str] = None
         self.requirements_context: Dict[str, Any] = {}
@@ -236,6 +275,21 @@ class ClarifyingChatAIAgent:
             return bool(os.getenv('OPENROUTER_API_KEY'))
         return bool(os.getenv('OPENAI_API_KEY') or os.getenv('openai_API_KEY'))
 
+    def _run_async(self, coro: Any) -> Any:
+        """Run a coroutine on the shared LLM event loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, _get_llm_loop()).result()
+
+    def _llm_model_settings(self) -> Optional[Dict[str, Any]]:
+        """Route requests by session id so OpenAI-compatible providers can reuse the cached prompt prefix"""
+        if not self.session:
+            return None
+        model_name = self.model_name or ''
+        provider = model_name.split(':', 1)[0].strip().lower() if ':' in model_name else ''
+        if provider not in ('openai', 'openrouter'):
+            return None
+        session_id = self.session.session_id
+        return {'openai_prompt_cache_key': session_id, 'openai_user': session_id}
+
     def _question_llm_ready(self) -> bool:
         if self.agent is None:
             return False
@@ -260,9 +314,116 @@ class ClarifyingChatAIAgent:
         next_field = self._get_next_field_to_ask()
         if next_field == "ALL_COMPLETE":
             return None
+
+        # Reuse a prefetched question for this field rather than asking the LLM again
+        prefetch = self._prefetch
+        if prefetch is not None and prefetch[0] == next_field:
+            self._prefetch = None
+            try:
+                _, diagnostics = prefetch[1].result(timeout=_PREFETCH_WAIT_SECONDS)
+            except Exception:  # includes a prefetch that is still running
+                diagnostics = {}
+            # The prefetched field is now the pending one, so its diagnostics become current
+            if diagnostics:
+                self._record_question_diagnostics(diagnostics['rejection'], diagnostics['ai_error'])
         return self._generate_question_for_field(next_field)
 
+    def prefetch_next_question(self, executor: Executor) -> None:
+        """Start generating the question after the pending one, assuming the pending field gets answered"""
+        if not self.session or not self._question_llm_ready():
+            return
+
+        pending_field = self._get_next_field_to_ask()
+        if pending_field == "ALL_COMPLETE":
+            return
+        upcoming_field = self._get_next_field_to_ask(assume_collected=pending_field)
+        if upcoming_field == "ALL_COMPLETE" or self.session.question_cache_llm.get(upcoming_field):
+            return
+        if self._prefetch is not None and self._prefetch[0] == upcoming_field:
+            return
+
+        self._prefetch = (upcoming_field, executor.submit(self._prefetch_question, upcoming_field))
+
+    def _prefetch_question(self, field_name: str) -> Tuple[ClarifyingQuestion, Dict[str, Optional[str]]]:
+        """
+        Worker-thread body for prefetch_next_question.
+
+        Returns its diagnostics instead of writing them to the agent while the UI is reading them.
+        """
+        diagnostics: Dict[str, Optional[str]] = {}
+        question = self._generate_question_for_field(field_name, diagnostics=diagnostics)
+        return question, diagnostics
+
+    def add_chat_message(self, role: str, content: Any, field_name: Optional[str] = None) -> Dict[str, Any]:
+        """Append a chat history entry, normalizing its content once at write time for UI replay"""
+        if not self.session:
+            raise ValueError("Session not initialized")
+
+        text = str(content or '').rstrip()
+        message = {
+            'role': role,
+            'field_name': field_name,
+            'content': text,
+            'timestamp': datetime.now().isoformat(),
+            '_nonempty': bool(text.strip()),
+        }
+        self.session.chat_history.append(message)
+        return message
+
     def handle_user_message(self, user_message: str) -> Dict[str, Any]:
+        turn = self._begin_user_turn(user_message)
+        if not turn.get('success'):
+            return turn
+
+        output = None
+        if turn['deps'] is not None:
+            output = self._run_chat_llm(turn['prompt'], turn['deps'])
+        return self._complete_user_turn(turn, output)
+
+    def stream_user_message(self, user_message: str) -> Iterator[str]:
+        """Same as handle_user_message, but yields the assistant reply as the LLM streams it.
+
+        The turn result is stored on ``last_turn_result`` once the generator is exhausted.
+        Streamed text is dropped from the chat history when field updates are applied,
+        exactly as handle_user_message drops the assistant message.
+        """
+        turn = self._begin_user_turn(user_message)
+        if not turn.get('success'):
+            self.last_turn_result = turn
+            yield turn['message']
+            return
+
+        output = None
+        streamed = ''
+        if turn['deps'] is not None:
+            try:
+                for kind, value in self._stream_chat_llm(turn['prompt'], turn['deps']):
+                    if kind == 'output':
+                        output = value
+                        break
+                    text = str(getattr(value, 'assistant_message', '') or '')
+                    if len(text) > len(streamed) and text.startswith(streamed):
+                        yield text[len(streamed):]
+                        streamed = text
+            except Exception as e:
+                self.last_ai_error = str(e)
+                self.last_chat_ai_error = self.last_ai_error
+
+            # Without a structured output the raw message would be stored as the field value,
+            # so any failed stream falls back to a regular (retrying) run
+            if output is None:
+                output = self._run_chat_llm(turn['prompt'], turn['deps'])
+
+        self.last_turn_result = self._complete_user_turn(turn, output)
+
+        remainder = self.last_turn_result['assistant_message']
+        if streamed and remainder.startswith(streamed.strip()):
+            remainder = remainder[len(streamed.strip()):]
+        if remainder:
+            yield remainder
+
+    def _begin_user_turn(self, user_message: str) -> Dict[str, Any]:
+        """Record the user message and build the chat LLM request for it (deps is None when the LLM is skipped)"""
         if not self.session:
             return {'success': False, 'message': 'Session not initialized'}
 
@@ -270,12 +431,7 @@ class ClarifyingChatAIAgent:
         if not cleaned_message:
             return {'success': False, 'message': 'Message cannot be empty'}
 
-        self.session.chat_history.append({
-            'role': 'user',
-            'field_name': None,
-            'content': cleaned_message,
-            'timestamp': datetime.now().isoformat(),
-        })
+        self.add_chat_message('user', cleaned_message)
 
         expected_field = self._get_next_field_to_ask()
         expected_field_config = (
@@ -284,11 +440,13 @@ class ClarifyingChatAIAgent:
             else {}
         )
 
-        assistant_message = ''
-        followup_question: Optional[str] = None
-        updates: List[Dict[str, Any]] = []
-        applied: List[Dict[str, Any]] = []
-        rejected: List[Dict[str, Any]] = []
+        turn: Dict[str, Any] = {
+            'success': True,
+            'cleaned_message': cleaned_message,
+            'expected_field': expected_field,
+            'deps': None,
+            'prompt': None,
+        }
 
         can_call_llm = self._chat_llm_ready()
         if can_call_llm and expected_field != 'ALL_COMPLETE':
@@ -309,7 +467,8 @@ class ClarifyingChatAIAgent:
             expected_desc = str(expected_field_config.get('description', '') or '').strip()
             expected_example = str(expected_field_config.get('example', '') or '').strip()
 
-            prompt = (
+            turn['deps'] = deps
+            turn['prompt'] = (
                 'Extract configuration field updates from the user message.\n'
                 'Return JSON matching the output schema.\n\n'
                 f"Diagnostic header: model_type={deps.model_type}, portfolio={deps.portfolio}, purpose={deps.purpose}\n\n"
@@ -320,26 +479,74 @@ class ClarifyingChatAIAgent:
                 f"User message: {deps.user_message}"
             )
 
-            output = None
-            last_exc: Optional[Exception] = None
-            for attempt in range(2):
-                try:
-                    result = self.chat_agent.run_sync(prompt, deps=deps)
-                    output = result.output
-                    last_exc = None
-                    break
-                except Exception as e:
-                    self.last_ai_error = str(e)
-                    self.last_chat_ai_error = self.last_ai_error
-                    last_exc = e
-                    if 'Received empty model response' in self.last_ai_error and attempt == 0:
-                        continue
-                    break
+        return turn
+
+    def _run_chat_llm(self, prompt: str, deps: _ChatDeps) -> Optional[_ChatOutput]:
+        output = None
+        for attempt in range(2):
+            try:
+                result = self._run_async(
+                    self.chat_agent.run(prompt, deps=deps, model_settings=self._llm_model_settings())
+                )
+                output = result.output
+                break
+            except Exception as e:
+                self.last_ai_error = str(e)
+                self.last_chat_ai_error = self.last_ai_error
+                output = None
+                if 'Received empty model response' in self.last_ai_error and attempt == 0:
+                    continue
+                break
+        return output
+
+    def _stream_chat_llm(self, prompt: str, deps: _ChatDeps) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield ('partial', output) items as the chat LLM streams, then ('output', final_output).
+
+        The stream runs under ``async with run_stream(...)`` on the shared LLM loop; closing
+        this generator early (e.g. an interrupted st.write_stream) cancels it, which closes
+        the open response.
+        """
+        items: 'queue.Queue[Tuple[str, Any]]' = queue.Queue()
+
+        async def _pump() -> None:
+            try:
+                async with self.chat_agent.run_stream(
+                    prompt, deps=deps, model_settings=self._llm_model_settings()
+                ) as result:
+                    async for partial in result.stream_output():
+                        items.put(('partial', partial))
+                    items.put(('output', await result.get_output()))
+            except Exception as e:
+                items.put(('error', e))
+
+        future = asyncio.run_coroutine_threadsafe(_pump(), _get_llm_loop())
+        try:
+            while True:
+                kind, value = items.get()
+                if kind == 'error':
+                    raise value
+                yield kind, value
+                if kind == 'output':
+                    return
+        finally:
+            future.cancel()
+
+    def _complete_user_turn(self, turn: Dict[str, Any], output: Optional[_ChatOutput]) -> Dict[str, Any]:
+        """Apply the field updates from the chat LLM output (or the raw message) and record the reply"""
+        cleaned_message = turn['cleaned_message']
+        expected_field = turn['expected_field']
+
+        assistant_message = ''
+        followup_question: Optional[str] = None
+        updates: List[Dict[str, Any]] = []
+        applied: List[Dict[str, Any]] = []
+        rejected: List[Dict[str, Any]] = []
 
-            if last_exc is None and isinstance(output, _ChatOutput):
-                assistant_message = str(output.assistant_message or '').strip()
-                followup_question = str(output.followup_question).strip() if output.followup_question else None
-                updates = [u.model_dump() for u in (output.updates or [])]
+        if isinstance(output, _ChatOutput):
+            assistant_message = str(output.assistant_message or '').strip()
+            followup_question = str(output.followup_question).strip() if output.followup_question else None
+            updates = [u.model_dump() for u in (output.updates or [])]
 
         def _asks_for_internal_context(text: Optional[str]) -> bool:
             if not text:
@@ -397,12 +604,11 @@ class ClarifyingChatAIAgent:
 
         assistant_text = '\n\n'.join([p for p in assistant_parts if str(p).strip()])
         if assistant_text:
-            self.session.chat_history.append({
-                'role': 'assistant',
-                'field_name': expected_field if expected_field != 'ALL_COMPLETE' else None,
-                'content': assistant_text,
-                'timestamp': datetime.now().isoformat(),
-            })
+            self.add_chat_message(
+                'assistant',
+                assistant_text,
+                field_name=expected_field if expected_field != 'ALL_COMPLETE' else None,
+            )
 
         return {
             'success': True,
@@ -426,6 +632,9 @@ class ClarifyingChatAIAgent:
         
         # Initialize session
         self.session = ChatSession(context=context)
+        self._completion_status_cache = None
+        self._field_summary_cache = None
+        self._prefetch = None
         
         # Initialize field status for all requirements
         for field_name in active_requirements.keys():
@@ -448,17 +657,23 @@ class ClarifyingChatAIAgent:
         self.session.current_question = question
         return question
 
-    def _generate_question_for_field(self, field_name: str) -> ClarifyingQuestion:
-        if not self.session:
+    def _generate_question_for_field(
+        self,
+        field_name: str,
+        diagnostics: Optional[Dict[str, Optional[str]]] = None,
+    ) -> ClarifyingQuestion:
+        # Bound once so a prefetch still in flight after a session reset writes to its own session
+        session = self.session
+        if not session:
             raise ValueError('Session not initialized')
 
-        cached = self.session.question_cache.get(field_name)
+        cached = session.question_cache.get(field_name)
         if cached is not None:
-            cached_is_llm = bool(self.session.question_cache_llm.get(field_name, False))
+            cached_is_llm = bool(session.question_cache_llm.get(field_name, False))
             if cached_is_llm or not self._question_llm_ready():
                 return cached
 
-        field_config = self.session.context.active_requirements.get(field_name, {})
+        field_config = session.context.active_requirements.get(field_name, {})
         default_question_text = _generate_question_text(field_name)
         question_text = default_question_text
         context_text = str(field_config.get('description', '') or '')
@@ -505,16 +720,17 @@ class ClarifyingChatAIAgent:
             return first
 
         used_llm = False
-        self.last_question_rejection = None
+        rejection: Optional[str] = None
+        ai_error: Optional[str] = None
         if self._question_llm_ready():
             deps = _LLMDeps(
-                model_type=self.session.context.model_type,
-                portfolio=self.session.context.portfolio,
-                purpose=self.session.context.purpose,
+                model_type=session.context.model_type,
+                portfolio=session.context.portfolio,
+                purpose=session.context.purpose,
                 requirements_context=self.requirements_context,
-                active_requirements=self.session.context.active_requirements,
-                collected_data=self.session.context.collected_data,
-                chat_history=self.session.chat_history,
+                active_requirements=session.context.active_requirements,
+                collected_data=session.context.collected_data,
+                chat_history=session.chat_history,
                 field_name=field_name,
                 field_config=field_config,
             )
@@ -531,15 +747,16 @@ class ClarifyingChatAIAgent:
             output = None
             for attempt in range(2):
                 try:
-                    result = self.agent.run_sync(prompt, deps=deps)
+                    result = self._run_async(
+                        self.agent.run(prompt, deps=deps, model_settings=self._llm_model_settings())
+                    )
                     output = result.output
                     last_exc = None
                     break
                 except Exception as e:
                     last_exc = e
-                    self.last_ai_error = str(e)
-                    self.last_question_ai_error = self.last_ai_error
-                    if 'Received empty model response' in self.last_ai_error and attempt == 0:
+                    ai_error = str(e)
+                    if 'Received empty model response' in ai_error and attempt == 0:
                         continue
                     break
 
@@ -553,9 +770,16 @@ class ClarifyingChatAIAgent:
 
                 if not used_llm:
                     preview = raw_q.strip().replace('\n', ' ')[:160]
-                    self.last_question_rejection = f'LLM question rejected (unusable/metadata). Raw preview: {preview}'
+                    rejection = f'LLM question rejected (unusable/metadata). Raw preview: {preview}'
             elif last_exc is not None:
-                self.last_question_rejection = f'LLM question failed: {str(last_exc)[:160]}'
+                rejection = f'LLM question failed: {str(last_exc)[:160]}'
+
+        # A prefetch hands its diagnostics back with the result; only the script thread
+        # updates the agent-level fields the UI captions read
+        if diagnostics is None:
+            self._record_question_diagnostics(rejection, ai_error)
+        else:
+            diagnostics.update(rejection=rejection, ai_error=ai_error)
 
         question = ClarifyingQuestion(
             field_name=field_name,
@@ -565,16 +789,24 @@ class ClarifyingChatAIAgent:
             is_mandatory=bool(field_config.get('mandatory', False)),
             field_type=field_type,
         )
-        self.session.question_cache[field_name] = question
-        self.session.question_cache_llm[field_name] = used_llm
+        session.question_cache[field_name] = question
+        session.question_cache_llm[field_name] = used_llm
         return question
 
-    def _get_next_field_to_ask(self) -> str:
-        """Get the next field to ask about"""
+    def _record_question_diagnostics(self, rejection: Optional[str], ai_error: Optional[str]) -> None:
+        self.last_question_rejection = rejection
+        if ai_error:
+            self.last_ai_error = ai_error
+            self.last_question_ai_error = ai_error
+
+    def _get_next_field_to_ask(self, assume_collected: Optional[str] = None) -> str:
+        """Get the next field to ask about, optionally treating one more field as answered"""
         if not self.session:
             return "ALL_COMPLETE"
         
         collected = set(self.session.collected_data.keys())
+        if assume_collected is not None:
+            collected.add(assume_collected)
         
         # Priority: mandatory fields first
         for field_name, field_config in self.session.context.active_requirements.items():
@@ -625,15 +857,12 @@ class ClarifyingChatAIAgent:
             self.session.field_status[field_name].status = "provided"
             self.session.field_status[field_name].value = cleaned_input
             self.session.field_status[field_name].timestamp = datetime.now()
+            self._completion_status_cache = None
+            self._field_summary_cache = None
             
             # Add to chat history
             if record_chat:
-                self.session.chat_history.append({
-                    'role': 'user',
-                    'field_name': field_name,
-                    'content': cleaned_input,
-                    'timestamp': datetime.now().isoformat()
-                })
+                self.add_chat_message('user', cleaned_input, field_name=field_name)
             
             return {
                 'success': True,
@@ -654,6 +883,10 @@ class ClarifyingChatAIAgent:
         if not self.session:
             return {'error': 'Session not initialized'}
         
+        # Recomputed only after collected data changes
+        if self._completion_status_cache is not None:
+            return dict(self._completion_status_cache)
+        
         mandatory_fields = [
             field for field, config in self.session.context.active_requirements.items()
             if config.get('mandatory', False)
@@ -674,7 +907,7 @@ class ClarifyingChatAIAgent:
             if self.session.field_status.get(field, FieldStatus(field_name=field, status="pending")).status == "provided"
         )
         
-        return {
+        self._completion_status_cache = {
             'mandatory_total': len(mandatory_fields),
             'mandatory_completed': mandatory_completed,
             'optional_total': len(optional_fields),
@@ -683,6 +916,7 @@ class ClarifyingChatAIAgent:
             'all_complete': (mandatory_completed == len(mandatory_fields) and
                            optional_completed == len(optional_fields))
         }
+        return dict(self._completion_status_cache)
     
     def get_collected_data(self) -> Dict[str, Any]:
         """Get all collected data in the format expected for Step 4"""
@@ -735,9 +969,7 @@ class ClarifyingChatAIAgent:
             header = current_json["header"]
             filename = f"current_diagnostic_{header['model_type']}_{header['portfolio']}_{header['purpose']}_{timestamp}.json"
 
-        from pathlib import Path as _Path
-
-        base_dir = _Path(__file__).resolve().parent
+        base_dir = Path(__file__).resolve().parent
         output_dir = base_dir / "outputs"
         output_dir.mkdir(parents=True, exist_ok=True)
         
@@ -761,6 +993,10 @@ class ClarifyingChatAIAgent:
         if not self.session:
             return []
         
+        # Rebuilt only after a field is updated, like get_completion_status
+        if self._field_summary_cache is not None:
+            return [dict(row) for row in self._field_summary_cache]
+        
         summary = []
         for field_name, field_config in self.session.context.active_requirements.items():
             field_status = self.session.field_status.get(field_name, FieldStatus(field_name=field_name, status="pending"))
@@ -775,8 +1011,12 @@ class ClarifyingChatAIAgent:
                 'example': field_config.get('example', '')
             })
         
-        return summary
+        self._field_summary_cache = summary
+        return [dict(row) for row in summary]
     
     def reset_session(self) -> None:
         """Reset the current session"""
         self.session = None
+        self._completion_status_cache = None
+        self._field_summary_cache = None
+        self._prefetch = None
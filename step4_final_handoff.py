@@ -1,14 +1,84 @@
 from __future__ import annotations
 
-import json
+import pprint
+from concurrent.futures import ThreadPoolExecutor
 import sqlite3
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import streamlit as st
+import json_codec
 from step4_json_store import Step4JSONStore
 
+try:
+    import zstandard as zstd
+except ImportError:  # execution results are stored as plain JSON text without it
+    zstd = None
+
+_ZSTD_LEVEL = 3
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _pack_result(obj: Any) -> Any:
+    """Encode an execution result for storage: a zstd BLOB when zstandard is installed, JSON text otherwise"""
+    if zstd is None:
+        return json_codec.dumps(obj)
+    # Compressor objects are not safe to share between threads, so one is made per call
+    return zstd.ZstdCompressor(level=_ZSTD_LEVEL).compress(json_codec.encode(obj))
+
+
+def _unpack_result(blob: bytes) -> Any:
+    if blob[:4] != _ZSTD_MAGIC:
+        return json_codec.loads(blob)
+    if zstd is None:
+        raise RuntimeError("zstandard is required to read compressed execution results")
+    return json_codec.loads(zstd.ZstdDecompressor().decompress(blob))
+
+
+_REQUIRED_HEADER_KEYS = frozenset({"model_type", "portfolio", "purpose"})
+
+# Statement texts are module constants so the connection's statement cache
+# (cached_statements) reuses their compiled form across calls
+# json() has SQLite validate and minify the already-encoded JSON text in C;
+# compressed results (BLOBs, see _pack_result) are stored as-is
+_INSERT_SQL = """
+INSERT INTO executions (timestamp, header_json, user_specs_json, execution_status, execution_result_json)
+VALUES (?1, json(?2), json(?3), ?4, CASE WHEN typeof(?5) = 'blob' THEN ?5 ELSE json(?5) END)
+"""
+
+# Column order of the rows returned by get_execution_history
+_HISTORY_COLUMNS = ("id", "timestamp", "execution_status")
+
+_SELECT_HISTORY_SQL = """
+SELECT id, timestamp, execution_status
+FROM executions
+ORDER BY id DESC
+LIMIT ?
+"""
+
+# The stored columns are already JSON, so SQLite's JSON1 assembles the payload;
+# a compressed result is returned separately for download_results to fill in
+_SELECT_ROW_SQL = """
+SELECT json_object(
+    'id', id,
+    'timestamp', timestamp,
+    'execution_status', execution_status,
+    'contract', json_object(
+        'header', json(header_json),
+        'user_specs', json(user_specs_json)
+    ),
+    'execution_result', CASE
+        WHEN typeof(execution_result_json) = 'text' THEN json(NULLIF(execution_result_json, ''))
+    END
+),
+CASE WHEN typeof(execution_result_json) = 'blob' THEN execution_result_json END
+FROM executions
+WHERE id = ?
+"""
+
 
 @dataclass(frozen=True)
 class FinalContract:
@@ -33,7 +103,12 @@ class FinalHandoffManager:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
         self.db_path = db_path or (self.output_dir / "diagnostic_results.db")
+        # One long-lived autocommit connection, shared by Streamlit's script threads
+        self._lock = threading.Lock()
+        self._conn = self._connect()
         self._init_db()
+        # File and DB writes triggered from the UI run here, off the script thread
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="handoff-io")
 
     def compile_final_json(self, header: Dict[str, Any], user_specs: Dict[str, Any]) -> Dict[str, Any]:
         if not isinstance(header, dict):
@@ -41,10 +116,9 @@ class FinalHandoffManager:
         if not isinstance(user_specs, dict):
             raise TypeError("user_specs must be a dict")
 
-        required_header_keys = ["model_type", "portfolio", "purpose"]
-        missing = [k for k in required_header_keys if not header.get(k)]
+        missing = _REQUIRED_HEADER_KEYS.difference(k for k, v in header.items() if v)
         if missing:
-            raise ValueError(f"Missing required header fields: {missing}")
+            raise ValueError(f"Missing required header fields: {sorted(missing)}")
 
         contract = FinalContract(header=header, user_specs=user_specs)
         return contract.to_dict()
@@ -54,7 +128,7 @@ class FinalHandoffManager:
             raise TypeError("final_json must be a dict")
 
         header = final_json.get("header") or {}
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
 
         if filename is None:
             model_type = str(header.get("model_type", "UNKNOWN")).replace(" ", "_")
@@ -64,127 +138,167 @@ class FinalHandoffManager:
 
         path = self.output_dir / filename
         with open(path, "w", encoding="utf-8") as f:
-            json.dump(final_json, f, indent=2, ensure_ascii=False)
+            f.write(json_codec.dumps(final_json, pretty=True))
 
         return str(path)
 
     def generate_modeling_script(self, final_json: Dict[str, Any]) -> str:
-        final_json_str = json.dumps(final_json, indent=2, ensure_ascii=False)
-        base_dir = Path(__file__).resolve().parent
-        return (
-            "import json\n"
-            "from pathlib import Path\n\n"
-            "CONTRACT = "
-            + repr(final_json_str)
-            + "\n\n"
-            "def load_contract() -> dict:\n"
-            "    return json.loads(CONTRACT)\n\n"
-            "def run_model(contract: dict) -> dict:\n"
-            "    header = contract.get('header', {})\n"
-            "    user_specs = contract.get('user_specs', {})\n"
-            "    return {\n"
-            "        'status': 'success',\n"
-            "        'echo': {\n"
-            "            'header': header,\n"
-            "            'user_specs': user_specs,\n"
-            "        }\n"
-            "    }\n\n"
-            "if __name__ == '__main__':\n"
-            "    contract = load_contract()\n"
-            "    results = run_model(contract)\n"
-            f"    out_dir = Path({repr(str(base_dir / 'outputs'))})\n"
-            "    out_dir.mkdir(parents=True, exist_ok=True)\n"
-            "    out_file = out_dir / 'model_results.json'\n"
-            "    out_file.write_text(json.dumps(results, indent=2), encoding='utf-8')\n"
-            "    print(f'Wrote results to: {out_file}')\n"
+        # The contract is embedded as a Python literal, so the script needs no JSON parse at startup
+        contract_literal = pprint.pformat(final_json, width=120, sort_dicts=False)
+        out_dir_literal = repr(str(Path(__file__).resolve().parent / "outputs"))
+        return f"""import json
+from pathlib import Path
+
+CONTRACT = {contract_literal}
+
+def load_contract() -> dict:
+    return CONTRACT
+
+def run_model(contract: dict) -> dict:
+    header = contract.get('header', {{}})
+    user_specs = contract.get('user_specs', {{}})
+    return {{
+        'status': 'success',
+        'echo': {{
+            'header': header,
+            'user_specs': user_specs,
+        }}
+    }}
+
+if __name__ == '__main__':
+    contract = load_contract()
+    results = run_model(contract)
+    out_dir = Path({out_dir_literal})
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_file = out_dir / 'model_results.json'
+    out_file.write_text(json.dumps(results, indent=2), encoding='utf-8')
+    print(f'Wrote results to: {{out_file}}')
+"""
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        # Per-connection settings; journal_mode=WAL is persistent and set once in _init_db
+        conn.executescript(
+            """
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+            PRAGMA cache_size=-8000;
+            PRAGMA journal_size_limit=6144000;
+            PRAGMA cache_spill=0;
+            """
         )
+        return conn
+
+    # Statements are run and their rows fetched under the lock; no live cursor leaves these helpers
+    def _exec(self, sql: str, params: tuple = ()) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
 
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS executions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    header_json TEXT NOT NULL,
-                    user_specs_json TEXT NOT NULL,
-                    execution_status TEXT NOT NULL,
-                    execution_result_json TEXT
-                )
-                """
+        self._exec(
+            """
+            CREATE TABLE IF NOT EXISTS executions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                header_json TEXT NOT NULL,
+                user_specs_json TEXT NOT NULL,
+                execution_status TEXT NOT NULL,
+                execution_result_json BLOB
             )
-            conn.commit()
+            """
+        )
+        # Covering index so get_execution_history is answered from the index alone
+        self._exec(
+            """
+            CREATE INDEX IF NOT EXISTS ix_exec_recent
+            ON executions(id DESC, timestamp, execution_status)
+            """
+        )
+        self._exec("PRAGMA journal_mode=WAL")
 
-    def save_execution_results(self, final_json: Dict[str, Any], execution_result: Dict[str, Any]) -> int:
-        header_json = json.dumps(final_json.get("header", {}), ensure_ascii=False)
-        user_specs_json = json.dumps(final_json.get("user_specs", {}), ensure_ascii=False)
+    def _execution_row(self, final_json: Dict[str, Any], execution_result: Dict[str, Any], timestamp: str) -> tuple:
+        header_json = json_codec.dumps(final_json.get("header", {}))
+        user_specs_json = json_codec.dumps(final_json.get("user_specs", {}))
 
         status = "unknown"
         if isinstance(execution_result, dict):
             status = str(execution_result.get("status", status))
 
-        execution_result_json = json.dumps(execution_result, ensure_ascii=False)
-        timestamp = datetime.now().isoformat()
-
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO executions (timestamp, header_json, user_specs_json, execution_status, execution_result_json)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (timestamp, header_json, user_specs_json, status, execution_result_json),
-            )
-            conn.commit()
-            return int(cur.lastrowid)
-
-    def get_execution_history(self, limit: int = 10) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(
-                """
-                SELECT id, timestamp, execution_status
-                FROM executions
-                ORDER BY id DESC
-                LIMIT ?
-                """,
-                (int(limit),),
-            ).fetchall()
-
-        return [dict(r) for r in rows]
-
-    def download_results(self, record_id: int) -> Optional[str]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            row = conn.execute(
-                """
-                SELECT id, timestamp, header_json, user_specs_json, execution_status, execution_result_json
-                FROM executions
-                WHERE id = ?
-                """,
-                (int(record_id),),
-            ).fetchone()
+        execution_result_json = _pack_result(execution_result)
+        return (timestamp, header_json, user_specs_json, status, execution_result_json)
+
+    def save_execution_results(self, final_json: Dict[str, Any], execution_result: Dict[str, Any]) -> int:
+        return self.save_execution_results_bulk([(final_json, execution_result)])[0]
+
+    def save_execution_results_bulk(self, rows: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[int]:
+        """Insert (final_json, execution_result) pairs in one transaction; returns their ids in order"""
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        params = [self._execution_row(final_json, result, timestamp) for final_json, result in rows]
+        if not params:
+            return []
+
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(_INSERT_SQL, params)
+            # The write lock is held until COMMIT, so the batch's ids are contiguous
+            last_id = int(self._conn.execute("SELECT last_insert_rowid()").fetchone()[0])
+
+        return list(range(last_id - len(params) + 1, last_id + 1))
+
+    def get_execution_history(self, limit: int = 10) -> List[Tuple[int, str, str]]:
+        """Most recent executions first, as plain (id, timestamp, execution_status) tuples"""
+        return self._fetchall(_SELECT_HISTORY_SQL, (int(limit),))
+
+    def download_results(self, record_id: int, pretty: bool = True) -> Optional[str]:
+        """Return a stored execution as JSON text; pretty=False skips re-indenting in Python"""
+        row = self._fetchone(_SELECT_ROW_SQL, (int(record_id),))
 
         if row is None:
             return None
 
-        payload = {
-            "id": row["id"],
-            "timestamp": row["timestamp"],
-            "execution_status": row["execution_status"],
-            "contract": {
-                "header": json.loads(row["header_json"]),
-                "user_specs": json.loads(row["user_specs_json"]),
-            },
-            "execution_result": json.loads(row["execution_result_json"]) if row["execution_result_json"] else None,
-        }
+        payload_json, compressed_result = row
+        if compressed_result is not None:
+            payload = json_codec.loads(payload_json)
+            payload["execution_result"] = _unpack_result(compressed_result)
+            return json_codec.dumps(payload, pretty=pretty)
+
+        if not pretty:
+            return payload_json
+        return json_codec.dumps(json_codec.loads(payload_json), pretty=True)
 
-        return json.dumps(payload, indent=2, ensure_ascii=False)
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def _encode_contract(final_json: Dict[str, Any]) -> str:
+    """
+    Pretty JSON text of the final contract, cached across reruns.
 
+    The cache key is the contract's content, header, user_specs and meta
+    included; meta carries the draft's last_updated stamp, so every draft save
+    produces a new entry, and max_entries bounds how many are kept.
+    """
+    return json_codec.dumps(final_json, pretty=True)
+
+
+@st.fragment
 def create_step4_ui(manager: FinalHandoffManager) -> None:
+    """Step 4 panel; its buttons rerun only this fragment, not the page above it"""
     st.markdown("---")
     st.subheader("Step 4 - Final Handoff")
+    stamp = time.strftime("%Y%m%d_%H%M%S")
 
     json_store = Step4JSONStore()
     draft = json_store.load()
@@ -202,14 +316,19 @@ def create_step4_ui(manager: FinalHandoffManager) -> None:
     if meta is not None:
         final_json["meta"] = meta
 
+    # One cached encoding serves both the display and the download
+    pretty = _encode_contract(final_json)
+
     st.markdown("### Final Contract JSON")
-    st.json(final_json)
+    st.code(pretty, language="json")
 
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("Save Final JSON", type="primary"):
             try:
-                path = manager.save_final_json(final_json)
+                future = manager._io_pool.submit(manager.save_final_json, final_json)
+                with st.spinner("Saving final JSON..."):
+                    path = future.result()
                 st.success(f"Saved: {path}")
             except Exception as e:
                 st.error(str(e))
@@ -217,14 +336,15 @@ def create_step4_ui(manager: FinalHandoffManager) -> None:
     with col2:
         st.download_button(
             label="Download Final JSON",
-            data=json.dumps(final_json, indent=2, ensure_ascii=False),
-            file_name=f"final_contract_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            data=pretty,
+            file_name=f"final_contract_{stamp}.json",
             mime="application/json",
         )
 
     st.markdown("### Execution History")
     history = manager.get_execution_history(limit=10)
     if history:
-        st.dataframe(history, width='stretch')
+        # Column-oriented dict: no per-row dicts, and st.dataframe keeps the column names
+        st.dataframe(dict(zip(_HISTORY_COLUMNS, zip(*history))), width='stretch')
     else:
         st.info("No executions saved yet.")
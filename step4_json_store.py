@@ -1,7 +1,28 @@
-import json
+import atexit
+import mmap
+import os
+import threading
+import time
+import weakref
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+import json_codec
+
+
+# Inactivity window after the last upsert_field before the draft is written
+_FLUSH_DELAY_SECONDS = 0.5
+
+# Stores with a draft pending; weak so the exit hook does not keep them alive
+_PENDING_STORES: "weakref.WeakSet[Step4JSONStore]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all() -> None:
+    for store in list(_PENDING_STORES):
+        store.flush()
 
 
 class Step4JSONStore:
@@ -11,10 +32,23 @@ class Step4JSONStore:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.filepath = self.output_dir / filename
 
+        # In-memory draft for upsert_field, written back by flush()
+        self._draft: Optional[Dict[str, Any]] = None
+        self._draft_completion_status: Optional[Dict[str, Any]] = None
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._flush_deadline = 0.0
+        self._lock = threading.RLock()
+
     def load(self) -> Dict[str, Any]:
         if self.filepath.exists():
-            with open(self.filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(self.filepath, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    # orjson parses straight from the mapped pages, no bytes copy
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        data = json_codec.loads(view)
+                else:  # empty files cannot be mapped
+                    data = json_codec.loads(f.read())
             if isinstance(data, dict):
                 return data
         return {}
@@ -31,8 +65,19 @@ class Step4JSONStore:
 
         data["meta"] = meta
 
-        with open(self.filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Write a sibling temp file and swap it in, so a crash mid-write never
+        # leaves a truncated draft; no fsync, the draft can be rebuilt from the UI
+        payload = json_codec.encode(data, pretty=True)
+        tmp_path = self.filepath.with_name(
+            f"{self.filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.filepath)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise
 
     def upsert_field(
         self,
@@ -40,19 +85,59 @@ class Step4JSONStore:
         field: str,
         value: Any,
         completion_status: Optional[Dict[str, Any]] = None,
-    ) -> Dict[str, Any]:
-        draft = self.load()
-
-        draft.setdefault("header", {})
-        if isinstance(draft["header"], dict):
-            draft["header"].update(header)
-        else:
-            draft["header"] = dict(header)
-
-        draft.setdefault("user_specs", {})
-        if not isinstance(draft["user_specs"], dict):
-            draft["user_specs"] = {}
-        draft["user_specs"][field] = value
-
-        self.save(draft, completion_status=completion_status)
-        return draft
+    ) -> Mapping[str, Any]:
+        """Update one field of the in-memory draft and return a read-only view of it; the file is written by a debounced flush()"""
+        with self._lock:
+            if self._draft is None:
+                self._draft = self.load()
+            draft = self._draft
+
+            draft.setdefault("header", {})
+            if isinstance(draft["header"], dict):
+                draft["header"].update(header)
+            else:
+                draft["header"] = dict(header)
+
+            draft.setdefault("user_specs", {})
+            if not isinstance(draft["user_specs"], dict):
+                draft["user_specs"] = {}
+            draft["user_specs"][field] = value
+
+            self._draft_completion_status = completion_status
+            self._dirty = True
+            self._schedule_flush()
+            return MappingProxyType(draft)
+
+    def flush(self) -> None:
+        """Write pending upsert_field changes to disk, if any"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            self.save(self._draft, completion_status=self._draft_completion_status)
+            self._dirty = False
+
+    def _schedule_flush(self) -> None:
+        # Called with the lock held: push the deadline back, starting a timer only if none is pending
+        self._flush_deadline = time.monotonic() + _FLUSH_DELAY_SECONDS
+        if self._flush_timer is None:
+            self._start_flush_timer(_FLUSH_DELAY_SECONDS)
+            _PENDING_STORES.add(self)
+
+    def _start_flush_timer(self, delay: float) -> None:
+        self._flush_timer = threading.Timer(delay, self._on_flush_timer)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _on_flush_timer(self) -> None:
+        with self._lock:
+            if self._flush_timer is not threading.current_thread():
+                return  # cancelled by flush() after firing
+            remaining = self._flush_deadline - time.monotonic()
+            if remaining > 0:
+                # Upserts arrived since this timer started; wait out the rest of the window
+                self._start_flush_timer(remaining)
+                return
+            self.flush()
@@ -0,0 +1,75 @@
+# ui_common.py
+import streamlit as st
+from enum import Enum
+
+# Custom CSS for styling
+CSS = """
+    <style>
+    .main {
+        max-width: 1000px;
+        padding: 2rem;
+    }
+    .header {
+        color: #2c3e50;
+        margin-bottom: 2rem;
+    }
+    .stSelectbox, .stButton {
+        margin: 1rem 0;
+    }
+    </style>
+    """
+
+# Landing-page help text, shown when no diagnostic has been run
+ABOUT_MD = """
+    This diagnostic pipeline helps analyze credit risk models by:
+    - Validating model performance
+    - Identifying potential issues
+    - Generating comprehensive reports
+    
+    ### Next Steps
+    1. Select your model type, portfolio, and purpose
+    2. Click 'Run Diagnostic'
+    3. Review the results and download reports
+    """
+
+
+# Enums for dropdown options
+class ModelType(str, Enum):
+    PD = "PD (Probability of Default)"
+    LGD = "LGD (Loss Given Default)"
+    EAD = "EAD (Exposure at Default)"
+
+
+class Portfolio(str, Enum):
+    RETAIL = "Retail"
+    COMMERCIAL = "Commercial"
+    WHOLESALE = "Wholesale"
+
+
+class Purpose(str, Enum):
+    IFRS9 = "IFRS 9"
+    AIRB = "AIRB (Advanced Internal Ratings-Based)"
+    ADJUDICATION = "Adjudication"
+
+
+MODEL_TYPE_VALUES = tuple(m.value for m in ModelType)
+PORTFOLIO_VALUES = tuple(p.value for p in Portfolio)
+PURPOSE_VALUES = tuple(p.value for p in Purpose)
+
+# Display label -> code used in requirement lookup keys and the contract header
+MODEL_LABEL_TO_CODE = {m.value: m.name for m in ModelType}
+PURPOSE_LABEL_TO_CODE = {
+    Purpose.IFRS9.value: "IFRS9",
+    Purpose.AIRB.value: "AIRB",
+    Purpose.ADJUDICATION.value: "Adjudication",
+}
+
+
+def configure_page() -> None:
+    """Apply page configuration and shared styling; call once at the top of each page"""
+    st.set_page_config(
+        page_title="Diagnostic Pipeline",
+        page_icon="📊",
+        layout="wide"
+    )
+    st.markdown(CSS, unsafe_allow_html=True)